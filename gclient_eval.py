@@ -4,9 +4,18 @@
 
 import ast
 import collections
-from io import StringIO
+import functools
+import hashlib
+from io import BytesIO, StringIO
 import logging
+import operator
+import os
+import pickle
+import sqlite3
+import stat
 import sys
+import threading
+import time
 import tokenize
 
 import gclient_utils
@@ -92,13 +101,21 @@ class _NodeDict(collections.abc.MutableMapping):
         self.data[key] = (value, node)
 
 
-def _NodeDictSchema(dict_schema):
-    """Validate dict_schema after converting _NodeDict to a regular dict."""
-    def validate(d):
-        schema.Schema(dict_schema).validate(dict(d))
+class _NodeDictSchema(object):
+    """Validates dict_schema after converting _NodeDict to a regular dict.
+
+    Keeps a reference to the declarative dict schema so that it can be
+    precompiled by _CompileSchema below.
+    """
+    def __init__(self, dict_schema):
+        self.dict_schema = dict_schema
+
+    def __call__(self, d):
+        schema.Schema(self.dict_schema).validate(dict(d))
         return True
 
-    return validate
+    def __repr__(self):
+        return '_NodeDictSchema(%r)' % (self.dict_schema, )
 
 
 # See https://github.com/keleshev/schema for docs how to configure schema.
@@ -303,9 +320,446 @@ _GCLIENT_SCHEMA = schema.Schema(
     }))
 
 
+def _CompileDictSchema(dict_schema):
+    """Compiles a declarative dict schema into a predicate for mappings.
+
+    Returns a callable taking a mapping and returning whether it matches
+    the schema. See _CompileSchema for the overall contract.
+    """
+    # Split the schema keys into literal keys (e.g. 'url', possibly wrapped
+    # in schema.Optional) and pattern keys (e.g. schema.Optional(str)). This
+    # mirrors the matching order of schema.Schema.validate, which tries
+    # literal keys before types.
+    literal_checks = {}
+    required_keys = set()
+    pattern_checks = []
+    for skey, svalue in dict_schema.items():
+        value_check = _CompileSchema(svalue)
+        key_schema = skey
+        if isinstance(key_schema, schema.Optional):
+            key_schema = key_schema._schema
+        elif not isinstance(key_schema, (type, schema.Schema)):
+            required_keys.add(key_schema)
+        if isinstance(key_schema, (type, schema.Schema)):
+            pattern_checks.append((_CompileSchema(key_schema), value_check))
+        else:
+            literal_checks[key_schema] = value_check
+
+    def check(data):
+        if not isinstance(data, collections.abc.Mapping):
+            return False
+        matched = set()
+        for key, value in data.items():
+            literal_check = literal_checks.get(key)
+            if literal_check is not None:
+                if not literal_check(value):
+                    return False
+                matched.add(key)
+                continue
+            for key_check, value_check in pattern_checks:
+                if key_check(key):
+                    if not value_check(value):
+                        return False
+                    break
+            else:
+                return False
+        return required_keys <= matched
+
+    return check
+
+
+def _CompileSchema(s):
+    """Compiles a declarative schema into a specialized predicate.
+
+    The schema library re-walks the schema tree on every validate() call,
+    which shows up in profiles when parsing many DEPS files. This flattens
+    the schema once at import time into nested closures that only perform
+    isinstance checks and dict lookups. The returned predicate accepts
+    exactly the data the schema accepts, except that it may conservatively
+    return False for constructs it does not recognize; callers fall back to
+    the schema library for authoritative validation and error messages.
+    """
+    if isinstance(s, schema.Optional):
+        return _CompileSchema(s._schema)
+    if isinstance(s, schema.Or):
+        checks = [_CompileSchema(sub) for sub in s._args]
+        return lambda data: any(check(data) for check in checks)
+    if isinstance(s, schema.Schema):
+        return _CompileSchema(s._schema)
+    if isinstance(s, _NodeDictSchema):
+        return _CompileDictSchema(s.dict_schema)
+    if isinstance(s, dict):
+        return _CompileDictSchema(s)
+    if isinstance(s, (list, tuple)):
+        container_type = type(s)
+        element_checks = [_CompileSchema(sub) for sub in s]
+        return lambda data: (isinstance(data, container_type) and all(
+            any(check(d) for check in element_checks) for d in data))
+    if isinstance(s, type):
+        return lambda data: isinstance(data, s)
+    if not callable(s) and not hasattr(s, 'validate'):
+        return lambda data: s == data
+    # Unrecognized validator or callable - defer to the schema library.
+    compiled = schema.Schema(s)
+
+    def check(data):
+        try:
+            compiled.validate(data)
+        except schema.SchemaError:
+            return False
+        return True
+
+    return check
+
+
+_COMPILED_GCLIENT_VALIDATOR = _CompileSchema(_GCLIENT_SCHEMA)
+
+# Version stamp mixed into the on-disk DEPS cache keys. Bump whenever the
+# parse results or their pickled representation change shape.
+_DEPS_CACHE_VERSION = 1
+
+# Upper bound on cached DEPS scopes; least recently used entries are evicted
+# past this point so the cache cannot grow without bound.
+_DEPS_CACHE_MAX_ENTRIES = 1024
+
+_deps_cache_lock = threading.Lock()
+_deps_cache_conn = None
+_deps_cache_disabled = False
+
+
+class _DepsCacheUnpickler(pickle.Unpickler):
+    """Unpickler restricted to the types a cached DEPS scope may contain.
+
+    The cache database lives in an owner-only directory, but deserializing
+    executable content from disk is still not worth the risk: only AST
+    nodes and the scope/token containers written by _DepsCachePut are
+    allowed, so a tampered or corrupt blob cannot run code and is simply
+    treated as a cache miss.
+    """
+
+    _SAFE_CLASSES = frozenset([
+        ('collections', 'OrderedDict'),
+        (__name__, '_NodeDict'),
+        (__name__, 'ConstantString'),
+    ])
+
+    def find_class(self, module, name):
+        if module == 'ast':
+            cls = getattr(ast, name, None)
+            if isinstance(cls, type) and issubclass(cls, ast.AST):
+                return cls
+        elif (module, name) in self._SAFE_CLASSES:
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError('%s.%s is not allowed in the DEPS cache' %
+                                     (module, name))
+
+
+def _DepsCacheDir():
+    """Returns the directory that holds the DEPS cache database."""
+    override = os.environ.get('GCLIENT_DEPS_CACHE_DIR')
+    if override:
+        return override
+    base = os.environ.get('XDG_CACHE_HOME')
+    if not base:
+        base = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'depot_tools')
+
+
+def _DepsCachePrivatePath():
+    """Ensures a private cache location and returns the database path.
+
+    The cache directory is created owner-only (0700) and the database file
+    owner read/write (0600) regardless of umask. Returns None if an
+    owner-controlled location cannot be guaranteed - e.g. the directory or
+    file belongs to another user - since unpickling data another local user
+    can write would hand them code execution.
+    """
+    cache_dir = _DepsCacheDir()
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    db_path = os.path.join(cache_dir, 'deps_cache.sqlite')
+    # Create the file up front so its mode does not depend on the umask
+    # sqlite3 happens to run with.
+    fd = os.open(db_path, os.O_CREAT | os.O_RDWR, 0o600)
+    os.close(fd)
+    if hasattr(os, 'getuid'):
+        uid = os.getuid()
+        dir_st = os.stat(cache_dir)
+        file_st = os.lstat(db_path)
+        if (dir_st.st_uid != uid or file_st.st_uid != uid
+                or dir_st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+                or not stat.S_ISREG(file_st.st_mode)):
+            return None
+    return db_path
+
+
+def _DepsCacheConnection():
+    """Returns the process-wide DEPS cache connection, or None if disabled.
+
+    Any failure to open a private, owner-controlled database permanently
+    disables caching for this process; parsing must never break because of
+    the cache.
+    """
+    global _deps_cache_conn, _deps_cache_disabled
+    if _deps_cache_disabled:
+        return None
+    if _deps_cache_conn is not None:
+        return _deps_cache_conn
+    if os.environ.get('GCLIENT_SUPPRESS_DEPS_CACHE'):
+        _deps_cache_disabled = True
+        return None
+    try:
+        db_path = _DepsCachePrivatePath()
+        if db_path is None:
+            _deps_cache_disabled = True
+            return None
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS deps_cache ('
+                     'hash TEXT PRIMARY KEY, scope BLOB, last_used REAL)')
+        conn.commit()
+    except (sqlite3.Error, OSError):
+        _deps_cache_disabled = True
+        return None
+    _deps_cache_conn = conn
+    return conn
+
+
+def _DepsCacheKey(content, vars_override, builtin_vars):
+    """Computes the cache key for an Exec() invocation.
+
+    The filename is deliberately not part of the key: it only affects error
+    messages, and errors are never cached.
+    """
+    h = hashlib.sha256()
+    h.update(b'%d\x00' % _DEPS_CACHE_VERSION)
+    h.update(content.encode('utf-8'))
+    h.update(b'\x00')
+    h.update(repr(sorted((vars_override or {}).items())).encode('utf-8'))
+    h.update(b'\x00')
+    h.update(repr(sorted((builtin_vars or {}).items())).encode('utf-8'))
+    return h.hexdigest()
+
+
+def _DepsCacheGet(key):
+    """Returns the cached scope for |key|, or None on miss or any failure."""
+    global _deps_cache_disabled
+    with _deps_cache_lock:
+        conn = _DepsCacheConnection()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute('SELECT scope FROM deps_cache WHERE hash=?',
+                               (key, )).fetchone()
+            if row is not None:
+                conn.execute('UPDATE deps_cache SET last_used=? WHERE hash=?',
+                             (time.time(), key))
+                conn.commit()
+        except sqlite3.Error:
+            _deps_cache_disabled = True
+            return None
+    if row is None:
+        return None
+    try:
+        return _DepsCacheUnpickler(BytesIO(row[0])).load()
+    except Exception:
+        # A corrupt, stale or tampered entry; treat it as a miss.
+        return None
+
+
+def _DepsCachePut(key, scope):
+    """Stores a successfully parsed and validated scope under |key|."""
+    global _deps_cache_disabled
+    try:
+        blob = pickle.dumps(scope, pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return
+    with _deps_cache_lock:
+        conn = _DepsCacheConnection()
+        if conn is None:
+            return
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO deps_cache (hash, scope, last_used) '
+                'VALUES (?, ?, ?)', (key, blob, time.time()))
+            count = conn.execute(
+                'SELECT COUNT(*) FROM deps_cache').fetchone()[0]
+            if count > _DEPS_CACHE_MAX_ENTRIES:
+                conn.execute(
+                    'DELETE FROM deps_cache WHERE hash IN ('
+                    'SELECT hash FROM deps_cache ORDER BY last_used LIMIT ?)',
+                    (count - _DEPS_CACHE_MAX_ENTRIES, ))
+            conn.commit()
+        except sqlite3.Error:
+            _deps_cache_disabled = True
+
+
+_ALLOWED_NAMES = {'None': None, 'True': True, 'False': False}
+
+
+def _unexpected_node(node, filename):
+    raise ValueError('unexpected AST node: %s %s (file %r, line %s)' %
+                     (node, ast.dump(node), filename,
+                      getattr(node, 'lineno', '<unknown>')))
+
+
+def _convert_string(value, node, filename, vars_dict):
+    if vars_dict is None:
+        return value
+    try:
+        return value.format(**vars_dict)
+    except KeyError as e:
+        raise KeyError(
+            '%s was used as a variable, but was not declared in the vars dict '
+            '(file %r, line %s)' %
+            (e.args[0], filename, getattr(node, 'lineno', '<unknown>')))
+
+
+def _convert_str(node, filename, vars_dict):
+    return _convert_string(node.s, node, filename, vars_dict)
+
+
+def _convert_num(node, filename, vars_dict):
+    return node.n
+
+
+def _convert_constant(node, filename, vars_dict):
+    value = node.value
+    if isinstance(value, str):
+        return _convert_string(value, node, filename, vars_dict)
+    if value is None or isinstance(value, (bool, int, float, complex)):
+        return value
+    # E.g. bytes or Ellipsis, which DEPS files may not contain.
+    _unexpected_node(node, filename)
+
+
+def _convert_tuple(node, filename, vars_dict):
+    return tuple(_convert(elt, filename, vars_dict) for elt in node.elts)
+
+
+def _convert_list(node, filename, vars_dict):
+    return [_convert(elt, filename, vars_dict) for elt in node.elts]
+
+
+def _convert_dict(node, filename, vars_dict):
+    node_dict = _NodeDict()
+    for key_node, value_node in zip(node.keys, node.values):
+        key = _convert(key_node, filename, vars_dict)
+        if key in node_dict:
+            raise ValueError(
+                'duplicate key in dictionary: %s (file %r, line %s)' %
+                (key, filename, getattr(key_node, 'lineno', '<unknown>')))
+        node_dict.SetNode(key, _convert(value_node, filename, vars_dict),
+                          value_node)
+    return node_dict
+
+
+def _convert_name(node, filename, vars_dict):
+    if node.id not in _ALLOWED_NAMES:
+        raise ValueError('invalid name %r (file %r, line %s)' %
+                         (node.id, filename, getattr(node, 'lineno',
+                                                     '<unknown>')))
+    return _ALLOWED_NAMES[node.id]
+
+
+def _convert_call(node, filename, vars_dict):
+    if (not isinstance(node.func, ast.Name)
+            or (node.func.id not in ('Str', 'Var'))):
+        raise ValueError(
+            'Str and Var are the only allowed functions (file %r, line %s)' %
+            (filename, getattr(node, 'lineno', '<unknown>')))
+    if node.keywords or getattr(node, 'starargs', None) or getattr(
+            node, 'kwargs', None) or len(node.args) != 1:
+        raise ValueError('%s takes exactly one argument (file %r, line %s)' %
+                         (node.func.id, filename,
+                          getattr(node, 'lineno', '<unknown>')))
+
+    if node.func.id == 'Str':
+        arg = node.args[0]
+        if isinstance(arg, ast.Constant):
+            value = arg.value
+        else:
+            # Pre-3.8 interpreters parse string literals to ast.Str.
+            value = getattr(arg, 's', None)
+        if isinstance(value, str):
+            return ConstantString(value)
+        raise ValueError('Passed a non-string to Str() (file %r, line%s)' %
+                         (filename, getattr(node, 'lineno', '<unknown>')))
+
+    arg = _convert(node.args[0], filename, vars_dict)
+    if not isinstance(arg, str):
+        raise ValueError(
+            'Var\'s argument must be a variable name (file %r, line %s)' %
+            (filename, getattr(node, 'lineno', '<unknown>')))
+    if vars_dict is None:
+        return '{' + arg + '}'
+    if arg not in vars_dict:
+        raise KeyError(
+            '%s was used as a variable, but was not declared in the vars dict '
+            '(file %r, line %s)' %
+            (arg, filename, getattr(node, 'lineno', '<unknown>')))
+    val = vars_dict[arg]
+    if isinstance(val, ConstantString):
+        val = val.value
+    return val
+
+
+def _convert_binop(node, filename, vars_dict):
+    op_handler = _BINOP_HANDLERS.get(type(node.op))
+    if op_handler is None:
+        _unexpected_node(node, filename)
+    return op_handler(_convert(node.left, filename, vars_dict),
+                      _convert(node.right, filename, vars_dict))
+
+
+_BINOP_HANDLERS = {
+    ast.Add: operator.add,
+    ast.Mod: operator.mod,
+}
+
+# Expression conversion dispatch, keyed on the exact AST node type. A single
+# dict lookup replaces the isinstance cascade this used to be, which walked
+# up to a dozen type checks for the nodes at the end of the chain.
+_HANDLERS = {
+    ast.Constant: _convert_constant,
+    ast.Tuple: _convert_tuple,
+    ast.List: _convert_list,
+    ast.Dict: _convert_dict,
+    ast.Name: _convert_name,
+    ast.Call: _convert_call,
+    ast.BinOp: _convert_binop,
+}
+
+# Python < 3.8 produced dedicated node classes for literals instead of
+# ast.Constant; register them when the running interpreter still has them.
+for _cls_name, _legacy_handler in (('Str', _convert_str), ('Num',
+                                                           _convert_num),
+                                   ('NameConstant', _convert_constant)):
+    _legacy_cls = getattr(ast, _cls_name, None)
+    if _legacy_cls is not None:
+        _HANDLERS.setdefault(_legacy_cls, _legacy_handler)
+del _cls_name, _legacy_handler, _legacy_cls
+
+
+def _convert(node, filename, vars_dict):
+    """Converts a single expression AST node. Helper for _gclient_eval.
+
+    Defined at module level so that evaluating each assignment in a DEPS
+    file does not rebuild the recursion; |vars_dict| is threaded through by
+    reference and never copied.
+    """
+    handler = _HANDLERS.get(type(node))
+    if handler is None:
+        _unexpected_node(node, filename)
+    return handler(node, filename, vars_dict)
+
+
 def _gclient_eval(node_or_string, filename='<unknown>', vars_dict=None):
-    """Safely evaluates a single expression. Returns the result."""
-    _allowed_names = {'None': None, 'True': True, 'False': False}
+    """Safely evaluates a single expression. Returns the result.
+
+    Accepts source strings for convenience; callers that already hold a
+    parsed expression node (e.g. Exec, once per assignment) should call
+    _convert directly and skip the type checks and unwrapping here.
+    """
     if isinstance(node_or_string, ConstantString):
         return node_or_string.value
     if isinstance(node_or_string, str):
@@ -314,94 +768,20 @@ def _gclient_eval(node_or_string, filename='<unknown>', vars_dict=None):
                                    mode='eval')
     if isinstance(node_or_string, ast.Expression):
         node_or_string = node_or_string.body
-
-    def _convert(node):
-        if isinstance(node, ast.Str):
-            if vars_dict is None:
-                return node.s
-            try:
-                return node.s.format(**vars_dict)
-            except KeyError as e:
-                raise KeyError(
-                    '%s was used as a variable, but was not declared in the vars dict '
-                    '(file %r, line %s)' %
-                    (e.args[0], filename, getattr(node, 'lineno', '<unknown>')))
-        elif isinstance(node, ast.Num):
-            return node.n
-        elif isinstance(node, ast.Tuple):
-            return tuple(map(_convert, node.elts))
-        elif isinstance(node, ast.List):
-            return list(map(_convert, node.elts))
-        elif isinstance(node, ast.Dict):
-            node_dict = _NodeDict()
-            for key_node, value_node in zip(node.keys, node.values):
-                key = _convert(key_node)
-                if key in node_dict:
-                    raise ValueError(
-                        'duplicate key in dictionary: %s (file %r, line %s)' %
-                        (key, filename, getattr(key_node, 'lineno',
-                                                '<unknown>')))
-                node_dict.SetNode(key, _convert(value_node), value_node)
-            return node_dict
-        elif isinstance(node, ast.Name):
-            if node.id not in _allowed_names:
-                raise ValueError(
-                    'invalid name %r (file %r, line %s)' %
-                    (node.id, filename, getattr(node, 'lineno', '<unknown>')))
-            return _allowed_names[node.id]
-        elif not sys.version_info[:2] < (3, 4) and isinstance(
-                node, ast.NameConstant):  # Since Python 3.4
-            return node.value
-        elif isinstance(node, ast.Call):
-            if (not isinstance(node.func, ast.Name)
-                    or (node.func.id not in ('Str', 'Var'))):
-                raise ValueError(
-                    'Str and Var are the only allowed functions (file %r, line %s)'
-                    % (filename, getattr(node, 'lineno', '<unknown>')))
-            if node.keywords or getattr(node, 'starargs', None) or getattr(
-                    node, 'kwargs', None) or len(node.args) != 1:
-                raise ValueError(
-                    '%s takes exactly one argument (file %r, line %s)' %
-                    (node.func.id, filename, getattr(node, 'lineno',
-                                                     '<unknown>')))
-
-            if node.func.id == 'Str':
-                if isinstance(node.args[0], ast.Str):
-                    return ConstantString(node.args[0].s)
-                raise ValueError(
-                    'Passed a non-string to Str() (file %r, line%s)' %
-                    (filename, getattr(node, 'lineno', '<unknown>')))
-
-            arg = _convert(node.args[0])
-            if not isinstance(arg, str):
-                raise ValueError(
-                    'Var\'s argument must be a variable name (file %r, line %s)'
-                    % (filename, getattr(node, 'lineno', '<unknown>')))
-            if vars_dict is None:
-                return '{' + arg + '}'
-            if arg not in vars_dict:
-                raise KeyError(
-                    '%s was used as a variable, but was not declared in the vars dict '
-                    '(file %r, line %s)' %
-                    (arg, filename, getattr(node, 'lineno', '<unknown>')))
-            val = vars_dict[arg]
-            if isinstance(val, ConstantString):
-                val = val.value
-            return val
-        elif isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
-            return _convert(node.left) + _convert(node.right)
-        elif isinstance(node, ast.BinOp) and isinstance(node.op, ast.Mod):
-            return _convert(node.left) % _convert(node.right)
-        else:
-            raise ValueError('unexpected AST node: %s %s (file %r, line %s)' %
-                             (node, ast.dump(node), filename,
-                              getattr(node, 'lineno', '<unknown>')))
-
-    return _convert(node_or_string)
+    return _convert(node_or_string, filename, vars_dict)
 
 
 def Exec(content, filename='<unknown>', vars_override=None, builtin_vars=None):
     """Safely execs a set of assignments."""
+    # Unchanged DEPS files dominate gclient sync runs; serve them from the
+    # on-disk cache to skip parsing, evaluation and validation entirely.
+    cache_key = None
+    if not _deps_cache_disabled:
+        cache_key = _DepsCacheKey(content, vars_override, builtin_vars)
+        cached_scope = _DepsCacheGet(cache_key)
+        if cached_scope is not None:
+            return cached_scope
+
     def _validate_statement(node, local_scope):
         if not isinstance(node, ast.Assign):
             raise ValueError('unexpected AST node: %s %s (file %r, line %s)' %
@@ -449,7 +829,7 @@ def Exec(content, filename='<unknown>', vars_override=None, builtin_vars=None):
     vars_dict = {}
     if 'vars' in statements:
         vars_statement = statements['vars']
-        value = _gclient_eval(vars_statement, filename)
+        value = _convert(vars_statement, filename, None)
         local_scope.SetNode('vars', value, vars_statement)
         # Update the parsed vars with the overrides, but only if they are
         # already present (overrides do not introduce new variables).
@@ -464,13 +844,22 @@ def Exec(content, filename='<unknown>', vars_override=None, builtin_vars=None):
              for k, v in vars_override.items() if k in vars_dict})
 
     for name, node in statements.items():
-        value = _gclient_eval(node, filename, vars_dict)
+        value = _convert(node, filename, vars_dict)
         local_scope.SetNode(name, value, node)
 
-    try:
-        return _GCLIENT_SCHEMA.validate(local_scope)
-    except schema.SchemaError as e:
-        raise gclient_utils.Error(str(e))
+    if not _COMPILED_GCLIENT_VALIDATOR(local_scope):
+        # The compiled validator is conservative: it may reject data the
+        # schema library accepts, and it produces no diagnostics. Re-validate
+        # with the schema library to either accept the scope or report a
+        # precise error.
+        try:
+            _GCLIENT_SCHEMA.validate(local_scope)
+        except schema.SchemaError as e:
+            raise gclient_utils.Error(str(e))
+
+    if cache_key is not None:
+        _DepsCachePut(cache_key, local_scope)
+    return local_scope
 
 
 def _StandardizeDeps(deps_dict, vars_dict):
@@ -584,14 +973,26 @@ def Parse(content, filename, vars_override=None, builtin_vars=None):
     return result
 
 
+@functools.lru_cache(maxsize=4096)
+def _parse_condition(condition):
+    """Parses a condition expression, caching the resulting AST.
+
+    The same condition strings are evaluated over and over during a sync:
+    once per dep carrying the condition, and again whenever a referenced
+    variable is expanded recursively. The parsed tree is only ever read, so
+    it can be shared between evaluations.
+    """
+    main_node = ast.parse(condition, mode='eval')
+    if isinstance(main_node, ast.Expression):
+        main_node = main_node.body
+    return main_node
+
+
 def EvaluateCondition(condition, variables, referenced_variables=None):
     """Safely evaluates a boolean condition. Returns the result."""
     if not referenced_variables:
         referenced_variables = set()
-    _allowed_names = {'None': None, 'True': True, 'False': False}
-    main_node = ast.parse(condition, mode='eval')
-    if isinstance(main_node, ast.Expression):
-        main_node = main_node.body
+    main_node = _parse_condition(condition)
 
     def _convert(node, allow_tuple=False):
         if isinstance(node, ast.Str):
@@ -605,8 +1006,8 @@ def EvaluateCondition(condition, variables, referenced_variables=None):
                 raise ValueError('invalid cyclic reference to %r (inside %r)' %
                                  (node.id, condition))
 
-            if node.id in _allowed_names:
-                return _allowed_names[node.id]
+            if node.id in _ALLOWED_NAMES:
+                return _ALLOWED_NAMES[node.id]
 
             if node.id in variables:
                 value = variables[node.id]
@@ -81,13 +81,19 @@ class OwnersClient(object):
                 status[path] = self.INSUFFICIENT_REVIEWERS
         return status
 
-    def ScoreOwners(self, paths, exclude=None):
-        """Get sorted list of owners for the given paths."""
+    def ScoreOwners(self, paths, exclude=None, owners_by_path=None):
+        """Get sorted list of owners for the given paths.
+
+        |owners_by_path| may be passed by callers that already hold the
+        result of BatchListOwners(paths) to avoid fetching it again.
+        """
         if not paths:
             return []
         exclude = exclude or []
+        if owners_by_path is None:
+            owners_by_path = self.BatchListOwners(paths)
         owners = []
-        queues = self.BatchListOwners(paths).values()
+        queues = owners_by_path.values()
         for i in range(max(len(q) for q in queues)):
             for q in queues:
                 if i < len(q) and q[i] not in owners and q[i] not in exclude:
@@ -106,7 +112,9 @@ class OwnersClient(object):
 
         selected = []
         missing = set(paths)
-        for owner in self.ScoreOwners(paths, exclude=exclude):
+        for owner in self.ScoreOwners(paths,
+                                      exclude=exclude,
+                                      owners_by_path=owners_by_path):
             missing_len = len(missing)
             missing.difference_update(paths_by_owner[owner])
             if missing_len > len(missing):
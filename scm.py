@@ -725,10 +725,10 @@ class GIT(object):
             if upstream_branch is None:
                 raise gclient_utils.Error('Cannot determine upstream branch')
 
-        command = [
-            '-c', 'core.quotePath=false', 'diff', '--name-status',
-            '--no-renames'
-        ]
+        # -z terminates every field with NUL, which avoids path quoting
+        # entirely and lets the output be parsed with a single split instead
+        # of a regex per line.
+        command = ['diff', '--name-status', '--no-renames', '-z']
         if ignore_submodules:
             command.append('--ignore-submodules=all')
         command.extend(['-r', '%s...%s' % (upstream_branch, end_commit)])
@@ -737,16 +737,19 @@ class GIT(object):
         assert isinstance(status, str)
         results = []
         if status:
-            for statusline in status.splitlines():
-                # 3-way merges can cause the status can be 'MMM' instead of 'M'.
-                # This can happen when the user has 2 local branches and he
-                # diffs between these 2 branches instead diffing to upstream.
-                m = re.match(r'^(\w)+\t(.+)$', statusline)
-                if not m:
-                    raise gclient_utils.Error(
-                        'status currently unsupported: %s' % statusline)
-                # Only grab the first letter.
-                results.append(('%s      ' % m.group(1)[0], m.group(2)))
+            # Output is alternating (status, path) fields; the NUL after the
+            # last field leaves a trailing empty element.
+            fields = status.split('\x00')
+            for i in range(0, len(fields) - 1, 2):
+                statusfield = fields[i]
+                if not statusfield or not statusfield[0].isalpha():
+                    raise gclient_utils.Error('status currently unsupported: %s'
+                                              % statusfield)
+                # 3-way merges can cause the status can be 'MMM' instead of
+                # 'M'. This can happen when the user has 2 local branches and
+                # he diffs between these 2 branches instead diffing to
+                # upstream. Only grab the first letter.
+                results.append(('%s      ' % statusfield[0], fields[i + 1]))
         return results
 
     @staticmethod
@@ -36,17 +36,20 @@ def EnsureInGitRepository():
     git.run('rev-parse')
 
 
-def CreateBranchForDirectories(prefix, directories, upstream):
+def CreateBranchForDirectories(prefix, directories, upstream,
+                               existing_branches):
     """Creates a branch named |prefix| + "_" + |directories[0]| + "_split".
 
     Return false if the branch already exists. |upstream| is used as upstream
-    for the created branch.
+    for the created branch. |existing_branches| is the set of branch names the
+    repository already has; it is queried once by the caller (listing branches
+    spawns a git subprocess) and updated in place with the created branch.
     """
-    existing_branches = set(git.branches(use_limit=False))
     branch_name = prefix + '_' + directories[0] + '_split'
     if branch_name in existing_branches:
         return False
     git.run('checkout', '-t', upstream, '-b', branch_name)
+    existing_branches.add(branch_name)
     return True
 
 
@@ -86,7 +89,8 @@ def AddUploadedByGitClSplitToDescription(description):
 
 def UploadCl(refactor_branch, refactor_branch_upstream, directories, files,
              description, comment, reviewers, changelist, cmd_upload,
-             cq_dry_run, enable_auto_submit, topic, repository_root):
+             cq_dry_run, enable_auto_submit, topic, repository_root,
+             existing_branches):
     """Uploads a CL with all changes to |files| in |refactor_branch|.
 
     Args:
@@ -103,36 +107,53 @@ def UploadCl(refactor_branch, refactor_branch_upstream, directories, files,
         cq_dry_run: If CL uploads should also do a cq dry run.
         enable_auto_submit: If CL uploads should also enable auto submit.
         topic: Topic to associate with uploaded CLs.
+        existing_branches: The set of branch names that already exist, updated
+            in place as split branches are created.
     """
     # Create a branch.
     if not CreateBranchForDirectories(refactor_branch, directories,
-                                      refactor_branch_upstream):
+                                      refactor_branch_upstream,
+                                      existing_branches):
         print('Skipping ' + FormatDirectoriesForPrinting(directories) +
               ' for which a branch already exists.')
         return
 
-    # Checkout all changes to files in |files|.
-    deleted_files = []
-    modified_files = []
-    for action, f in files:
-        abspath = os.path.abspath(os.path.join(repository_root, f))
-        if action == 'D':
-            deleted_files.append(abspath)
-        else:
-            modified_files.append(abspath)
-
+    # Checkout all changes to files in |files|. The repository root is
+    # resolved once; per-file paths only need a join and normalization.
+    root = os.path.abspath(repository_root)
+    deleted_files = [
+        os.path.normpath(os.path.join(root, f)) for action, f in files
+        if action == 'D'
+    ]
+    modified_files = [
+        os.path.normpath(os.path.join(root, f)) for action, f in files
+        if action != 'D'
+    ]
+
+    # Pass the paths on stdin as NUL-separated pathspecs rather than as
+    # argv entries; CLs touching thousands of files would otherwise risk
+    # exceeding the OS argument-size limit.
     if deleted_files:
-        git.run(*['rm'] + deleted_files)
+        git.run('rm',
+                '--pathspec-from-file=-',
+                '--pathspec-file-nul',
+                indata=b'\x00'.join(
+                    f.encode('utf-8') for f in deleted_files))
     if modified_files:
-        git.run(*['checkout', refactor_branch, '--'] + modified_files)
-
-    # Commit changes. The temporary file is created with delete=False so that it
-    # can be deleted manually after git has read it rather than automatically
-    # when it is closed.
-    with gclient_utils.temporary_file() as tmp_file:
-        gclient_utils.FileWrite(
-            tmp_file, FormatDescriptionOrComment(description, directories))
-        git.run('commit', '-F', tmp_file)
+        git.run('checkout',
+                refactor_branch,
+                '--pathspec-from-file=-',
+                '--pathspec-file-nul',
+                indata=b'\x00'.join(
+                    f.encode('utf-8') for f in modified_files))
+
+    # Commit changes. The description is streamed on stdin, which avoids
+    # writing, reading back and deleting a temporary file for every CL.
+    git.run('commit',
+            '-F',
+            '-',
+            indata=FormatDescriptionOrComment(description,
+                                              directories).encode('utf-8'))
 
     # Upload a CL.
     upload_args = ['-f']
@@ -169,7 +190,11 @@ def GetFilesSplitByOwners(files, max_depth):
         A map where keys are paths to directories containing an OWNERS file and
         values are lists of files sharing an OWNERS file.
     """
-    files_split_by_owners = {}
+    files_split_by_owners = collections.defaultdict(list)
+    # Every file in a directory resolves to the same OWNERS directory, so
+    # remember resolutions instead of re-probing the filesystem for each
+    # sibling file.
+    owners_dir_cache = {}
     for action, path in files:
         # normpath() is important to normalize separators here, in prepration
         # for str.split() before. It would be nicer to use something like
@@ -178,12 +203,25 @@ def GetFilesSplitByOwners(files, max_depth):
         if max_depth >= 1:
             dir_with_owners = os.path.join(
                 *dir_with_owners.split(os.path.sep)[:max_depth])
-        # Find the closest parent directory with an OWNERS file.
-        while (dir_with_owners not in files_split_by_owners
-               and not os.path.isfile(os.path.join(dir_with_owners, 'OWNERS'))):
+        # Find the closest parent directory with an OWNERS file. Record the
+        # resolution for every directory on the way up (path compression), so
+        # each distinct directory in the tree is walked at most once no
+        # matter how many files map to it.
+        visited_dirs = []
+        while True:
+            cached_dir = owners_dir_cache.get(dir_with_owners)
+            if cached_dir is not None:
+                dir_with_owners = cached_dir
+                break
+            if (dir_with_owners in files_split_by_owners or os.path.isfile(
+                    os.path.join(dir_with_owners, 'OWNERS'))):
+                break
+            visited_dirs.append(dir_with_owners)
             dir_with_owners = os.path.dirname(dir_with_owners)
-        files_split_by_owners.setdefault(dir_with_owners, []).append(
-            (action, path))
+        owners_dir_cache[dir_with_owners] = dir_with_owners
+        for visited_dir in visited_dirs:
+            owners_dir_cache[visited_dir] = dir_with_owners
+        files_split_by_owners[dir_with_owners].append((action, path))
     return files_split_by_owners
 
 
@@ -287,6 +325,13 @@ def SplitCl(description_file, comment_file, changelist, cmd_upload, dry_run,
             if answer.lower() != 'y':
                 return 0
 
+        # List the branches once up front; creating each split branch only
+        # consults (and updates) this set instead of re-running git branch
+        # for every CL.
+        existing_branches = None
+        if not dry_run:
+            existing_branches = set(git.branches(use_limit=False))
+
         cls_per_reviewer = collections.defaultdict(int)
         for cl_index, (reviewers, cl_info) in \
             enumerate(files_split_by_reviewers.items(), 1):
@@ -301,7 +346,8 @@ def SplitCl(description_file, comment_file, changelist, cmd_upload, dry_run,
                 UploadCl(refactor_branch, refactor_branch_upstream,
                          cl_info.owners_directories, cl_info.files, description,
                          comment, reviewer_set, changelist, cmd_upload,
-                         cq_dry_run, enable_auto_submit, topic, repository_root)
+                         cq_dry_run, enable_auto_submit, topic, repository_root,
+                         existing_branches)
 
             for reviewer in reviewers:
                 cls_per_reviewer[reviewer] += 1
@@ -6,8 +6,13 @@
 import itertools
 import logging
 import os
+import pickle
+import shutil
+import sqlite3
 import sys
+import tempfile
 import unittest
+from unittest import mock
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -15,9 +20,16 @@ import metrics_utils
 # We have to disable monitoring before importing gclient.
 metrics_utils.COLLECT_METRICS = False
 
+# The parser tests below must exercise the tokenizer, evaluator and schema
+# validation on every run, not be served parse results from a warm on-disk
+# cache. DepsCacheTest re-enables the cache with a private directory.
+os.environ['GCLIENT_SUPPRESS_DEPS_CACHE'] = '1'
+
 import gclient_eval
 import gclient_utils
 
+from third_party import schema
+
 # TODO: Should fix these warnings.
 # pylint: disable=line-too-long
 
@@ -1318,6 +1330,230 @@ class ParseTest(unittest.TestCase):
             }, local_scope)
 
 
+class CompiledSchemaValidatorTest(unittest.TestCase):
+    """Tests the precompiled validator against the schema library.
+
+    The compiled validator is the fast path in Exec(); if it silently
+    degraded to rejecting everything the optimization would be dead (every
+    scope would take the schema-library fallback), and if it accepted a
+    scope the schema library rejects, validation would be skipped. Assert
+    both directions on representative scopes.
+    """
+
+    def assertAccepted(self, scope):
+        # Cross-check: the schema library must agree.
+        gclient_eval._GCLIENT_SCHEMA.validate(scope)
+        self.assertTrue(gclient_eval._COMPILED_GCLIENT_VALIDATOR(scope))
+
+    def assertRejected(self, scope):
+        with self.assertRaises(schema.SchemaError):
+            gclient_eval._GCLIENT_SCHEMA.validate(scope)
+        self.assertFalse(gclient_eval._COMPILED_GCLIENT_VALIDATOR(scope))
+
+    def test_accepts_empty_scope(self):
+        self.assertAccepted(gclient_eval.Exec(''))
+
+    def test_accepts_representative_deps_file(self):
+        scope = gclient_eval.Exec(
+            file_join([
+                'git_dependencies = "SYNC"',
+                'allowed_hosts = ["example.com"]',
+                'vars = {',
+                '  "str_var": "a",',
+                '  "const_var": Str("b"),',
+                '  "bool_var": True,',
+                '}',
+                'deps = {',
+                '  "src/none": None,',
+                '  "src/str": "https://example.com/str@{str_var}",',
+                '  "src/git": {',
+                '    "url": "https://example.com/git",',
+                '    "condition": "checkout_linux",',
+                '    "dep_type": "git",',
+                '  },',
+                '  "src/cipd": {',
+                '    "packages": [',
+                '      {"package": "pkg", "version": "ver"},',
+                '    ],',
+                '    "dep_type": "cipd",',
+                '  },',
+                '  "src/gcs": {',
+                '    "bucket": "bucket",',
+                '    "objects": [',
+                '      {',
+                '        "object_name": "name",',
+                '        "sha256sum": "deadbeef",',
+                '        "size_bytes": 1,',
+                '        "generation": 2,',
+                '        "output_file": "out",',
+                '      },',
+                '    ],',
+                '    "dep_type": "gcs",',
+                '  },',
+                '}',
+                'deps_os = {',
+                '  "unix": {"src/os": "https://example.com/os"},',
+                '}',
+                'hooks = [',
+                '  {',
+                '    "name": "hook",',
+                '    "pattern": ".",',
+                '    "cwd": ".",',
+                '    "condition": "checkout_mac",',
+                '    "action": ["python3", "script.py"],',
+                '  },',
+                ']',
+                'hooks_os = {',
+                '  "mac": [{"action": ["do"]}],',
+                '}',
+                'pre_deps_hooks = [{"action": ["do"]}]',
+                'include_rules = ["+base"]',
+                'skip_child_includes = ["testing"]',
+                'specific_include_rules = {',
+                '  "src/x": ["+y"],',
+                '}',
+                'recursion = 1',
+                'recursedeps = [',
+                '  "src/str",',
+                '  ("src/git", "DEPS.alt"),',
+                '  ["src/cipd", "DEPS.alt"],',
+                ']',
+                'gclient_gn_args_from = "src/str"',
+                'gclient_gn_args_file = "args.gni"',
+                'gclient_gn_args = ["str_var"]',
+                'target_os = ["linux"]',
+                'use_relative_paths = True',
+                'use_relative_hooks = False',
+                'noparent = False',
+                'new_usages_require_review = True',
+            ]))
+        self.assertAccepted(scope)
+
+    def test_rejects_unknown_top_level_key(self):
+        self.assertRejected({'bogus': 'x'})
+
+    def test_rejects_wrong_value_type(self):
+        self.assertRejected({'include_rules': {}})
+        self.assertRejected({'recursion': 'not an int'})
+        self.assertRejected({'vars': {'a': 1}})
+        self.assertRejected({'hooks': {}})
+
+    def test_rejects_missing_required_key(self):
+        self.assertRejected(
+            {'deps': {
+                'src/a': {
+                    'packages': [{
+                        'package': 'pkg'
+                    }]
+                }
+            }})
+        self.assertRejected({'hooks': [{'name': 'no action'}]})
+
+    def test_rejects_extra_key(self):
+        self.assertRejected(
+            {'deps': {
+                'src/a': {
+                    'url': 'https://example.com',
+                    'bogus': 1
+                }
+            }})
+
+
+class DepsCacheTest(unittest.TestCase):
+    """Tests for the on-disk DEPS parse cache."""
+
+    CONTENT = 'deps = {\n  "src/a": "https://example.com/a@1",\n}\n'
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        patcher = mock.patch.dict(
+            os.environ, {'GCLIENT_DEPS_CACHE_DIR': self.cache_dir})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        del os.environ['GCLIENT_SUPPRESS_DEPS_CACHE']
+        self._ResetCacheState()
+        self.addCleanup(self._ResetCacheState)
+
+    def _ResetCacheState(self):
+        if gclient_eval._deps_cache_conn is not None:
+            gclient_eval._deps_cache_conn.close()
+        gclient_eval._deps_cache_conn = None
+        gclient_eval._deps_cache_disabled = False
+
+    def _DbPath(self):
+        return os.path.join(self.cache_dir, 'deps_cache.sqlite')
+
+    def _OverwriteCachedBlob(self, blob):
+        conn = sqlite3.connect(self._DbPath())
+        conn.execute('UPDATE deps_cache SET scope=?', (blob, ))
+        conn.commit()
+        conn.close()
+
+    def test_hit_returns_fresh_equal_scope(self):
+        scope = gclient_eval.Exec(self.CONTENT)
+        # A warm run must not evaluate anything.
+        with mock.patch.object(gclient_eval,
+                               '_convert',
+                               side_effect=AssertionError('unexpected miss')):
+            cached = gclient_eval.Exec(self.CONTENT)
+        self.assertIsNot(scope, cached)
+        self.assertEqual(scope, cached)
+
+    def test_miss_for_unknown_key(self):
+        gclient_eval.Exec(self.CONTENT)
+        key = gclient_eval._DepsCacheKey('deps = {}', None, None)
+        self.assertIsNone(gclient_eval._DepsCacheGet(key))
+
+    def test_key_covers_overrides(self):
+        content = ('vars = {\n  "a": "b",\n}\n'
+                   'deps = {\n  "src/a": "https://example.com/{a}",\n}\n')
+        plain = gclient_eval.Exec(content)
+        overridden = gclient_eval.Exec(content, vars_override={'a': 'c'})
+        self.assertEqual('https://example.com/b', plain['deps']['src/a'])
+        self.assertEqual('https://example.com/c', overridden['deps']['src/a'])
+
+    def test_corrupt_entry_is_a_miss(self):
+        scope = gclient_eval.Exec(self.CONTENT)
+        self._OverwriteCachedBlob(b'not a pickle')
+        key = gclient_eval._DepsCacheKey(self.CONTENT, None, None)
+        self.assertIsNone(gclient_eval._DepsCacheGet(key))
+        # Exec falls back to parsing.
+        self.assertEqual(scope, gclient_eval.Exec(self.CONTENT))
+
+    def test_unexpected_pickled_object_is_a_miss(self):
+        gclient_eval.Exec(self.CONTENT)
+        self._OverwriteCachedBlob(pickle.dumps(os.getcwd))
+        key = gclient_eval._DepsCacheKey(self.CONTENT, None, None)
+        self.assertIsNone(gclient_eval._DepsCacheGet(key))
+
+    def test_version_bump_invalidates(self):
+        gclient_eval.Exec(self.CONTENT)
+        key = gclient_eval._DepsCacheKey(self.CONTENT, None, None)
+        self.assertIsNotNone(gclient_eval._DepsCacheGet(key))
+        with mock.patch.object(gclient_eval, '_DEPS_CACHE_VERSION',
+                               gclient_eval._DEPS_CACHE_VERSION + 1):
+            new_key = gclient_eval._DepsCacheKey(self.CONTENT, None, None)
+            self.assertNotEqual(key, new_key)
+            self.assertIsNone(gclient_eval._DepsCacheGet(new_key))
+
+    def test_opt_out_env_var(self):
+        with mock.patch.dict(os.environ,
+                             {'GCLIENT_SUPPRESS_DEPS_CACHE': '1'}):
+            self._ResetCacheState()
+            gclient_eval.Exec(self.CONTENT)
+            self.assertFalse(os.path.exists(self._DbPath()))
+
+    def test_eviction_caps_entries(self):
+        with mock.patch.object(gclient_eval, '_DEPS_CACHE_MAX_ENTRIES', 3):
+            for i in range(5):
+                gclient_eval._DepsCachePut('key%d' % i, {'i': i})
+        conn = sqlite3.connect(self._DbPath())
+        count = conn.execute('SELECT COUNT(*) FROM deps_cache').fetchone()[0]
+        conn.close()
+        self.assertEqual(3, count)
+
+
 if __name__ == '__main__':
     level = logging.DEBUG if '-v' in sys.argv else logging.FATAL
     logging.basicConfig(level=level,
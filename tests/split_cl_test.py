@@ -98,30 +98,28 @@ class SplitClTest(unittest.TestCase):
     class UploadClTester:
         """Sets up test environment for testing split_cl.UploadCl()"""
         def __init__(self, test):
-            self.mock_git_branches = self.StartPatcher("git_common.branches",
-                                                       test)
-            self.mock_git_branches.return_value = []
             self.mock_git_current_branch = self.StartPatcher(
                 "git_common.current_branch", test)
             self.mock_git_current_branch.return_value = "branch_to_upload"
             self.mock_git_run = self.StartPatcher("git_common.run", test)
-            self.mock_temporary_file = self.StartPatcher(
-                "gclient_utils.temporary_file", test)
-            self.mock_temporary_file(
-            ).__enter__.return_value = "temporary_file0"
-            self.mock_file_writer = self.StartPatcher("gclient_utils.FileWrite",
-                                                      test)
 
         def StartPatcher(self, target, test):
             patcher = mock.patch(target)
             test.addCleanup(patcher.stop)
             return patcher.start()
 
-        def DoUploadCl(self, directories, files, reviewers, cmd_upload):
+        def DoUploadCl(self,
+                       directories,
+                       files,
+                       reviewers,
+                       cmd_upload,
+                       existing_branches=None):
+            if existing_branches is None:
+                existing_branches = set()
             split_cl.UploadCl("branch_to_upload", "upstream_branch",
                               directories, files, "description", None,
                               reviewers, mock.Mock(), cmd_upload, True, True,
-                              "topic", os.path.sep)
+                              "topic", os.path.sep, existing_branches)
 
     def testUploadCl(self):
         """Tests commands run by UploadCl."""
@@ -142,10 +140,18 @@ class SplitClTest(unittest.TestCase):
         mock_git_run.assert_has_calls([
             mock.call("checkout", "-t", "upstream_branch", "-b",
                       "branch_to_upload_dir0_split"),
-            mock.call("rm", os.path.join(abs_repository_path, "foo", "b.cc")),
-            mock.call("checkout", "branch_to_upload", "--",
-                      os.path.join(abs_repository_path, "bar", "a.cc")),
-            mock.call("commit", "-F", "temporary_file0")
+            mock.call("rm",
+                      "--pathspec-from-file=-",
+                      "--pathspec-file-nul",
+                      indata=os.path.join(abs_repository_path, "foo",
+                                          "b.cc").encode("utf-8")),
+            mock.call("checkout",
+                      "branch_to_upload",
+                      "--pathspec-from-file=-",
+                      "--pathspec-file-nul",
+                      indata=os.path.join(abs_repository_path, "bar",
+                                          "a.cc").encode("utf-8")),
+            mock.call("commit", "-F", "-", indata=b"description")
         ])
 
         expected_upload_args = [
@@ -159,17 +165,15 @@ class SplitClTest(unittest.TestCase):
         """Tests that a CL is not uploaded if split branch already exists"""
 
         upload_cl_tester = self.UploadClTester(self)
-        upload_cl_tester.mock_git_branches.return_value = [
-            "branch0", "branch_to_upload_dir0_split"
-        ]
 
         directories = ["dir0"]
         files = [("M", os.path.join("bar", "a.cc")),
                  ("D", os.path.join("foo", "b.cc"))]
         reviewers = {"reviewer1@gmail.com"}
         mock_cmd_upload = mock.Mock()
-        upload_cl_tester.DoUploadCl(directories, files, reviewers,
-                                    mock_cmd_upload)
+        upload_cl_tester.DoUploadCl(
+            directories, files, reviewers, mock_cmd_upload,
+            existing_branches={"branch0", "branch_to_upload_dir0_split"})
 
         upload_cl_tester.mock_git_run.assert_not_called()
         mock_cmd_upload.assert_not_called()